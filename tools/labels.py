@@ -1,7 +1,9 @@
 """Tools for working with labels and their milestones and branches for Meeseeks."""
 
-from dataclasses import dataclass
-from re import match
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Self, TypeVar
 
 from github.Branch import Branch
@@ -12,18 +14,27 @@ from options import Options
 from packaging.version import Version, parse
 
 MAJOR_MINOR_REGEX = r"([0-9]+)\.([0-9]+)"
-BRANCH_NAME_REGEX = rf"{MAJOR_MINOR_REGEX}\.x$"
+BRANCH_NAME_REGEX = rf"{MAJOR_MINOR_REGEX}\.x"
 MILESTONE_REGEX = rf"{MAJOR_MINOR_REGEX}(\.([0-9]+))?"
 
 
+@lru_cache
+def _branch_re(tag_prefix: str) -> re.Pattern:
+    """Return the compiled backport branch name regex for a tag prefix."""
+    return re.compile(rf"{re.escape(tag_prefix)}{BRANCH_NAME_REGEX}", re.ASCII)
+
+
+@lru_cache
+def _milestone_re(tag_prefix: str) -> re.Pattern:
+    """Return the compiled milestone title regex for a tag prefix."""
+    return re.compile(rf"{re.escape(tag_prefix)}{MILESTONE_REGEX}", re.ASCII)
+
+
 def _get_branch_name(label: Label, options: Options) -> str:
     """Return the branch name for a backport label."""
     name = label.name.split("-")[1]
 
-    if not match(
-        f"^{options.tag_prefix}{BRANCH_NAME_REGEX}",
-        name,
-    ):
+    if not _branch_re(options.tag_prefix).fullmatch(name):
         msg = f"Label name: {label.name} does not match expected format"
 
         raise ValueError(msg)
@@ -31,24 +42,63 @@ def _get_branch_name(label: Label, options: Options) -> str:
     return name
 
 
+_MC = TypeVar("_MC", bound="MilestoneCache")
+
+
+@dataclass(slots=True)
+class MilestoneCache:
+    """
+    Hold the open milestones of a repository fetched once per run.
+
+        latest is a memo filled in by _get_branch_milestone, which may be
+        called from several threads at once. A race only repeats the lookup,
+        as every thread stores the same milestone for a given prefix.
+    """
+
+    milestones: list[Milestone]
+    latest: dict[str, Milestone] = field(default_factory=dict)
+
+    @classmethod
+    def from_milestones(
+        cls: type[_MC],
+        milestones: Iterable[Milestone],
+        options: Options,
+    ) -> _MC:
+        """Keep only the milestones whose titles are versions."""
+        name_regex = _milestone_re(options.tag_prefix)
+
+        return cls(
+            [
+                milestone
+                for milestone in milestones
+                if name_regex.fullmatch(milestone.title)
+            ],
+        )
+
+
 def _get_branch_milestone(
-    repo: Repository,
+    cache: MilestoneCache,
     title_prefix: str,
     options: Options,
 ) -> Milestone | None:
     if options.run_milestone:
-        name_regex = f"^{options.tag_prefix}{MILESTONE_REGEX}"
-
-        milestones = {
-            parse(milestone.title): milestone
-            for milestone in repo.get_milestones(state="open")
-            if match(name_regex, milestone.title) and title_prefix in milestone.title
-        }
-        try:
-            return milestones[sorted(milestones.keys())[-1]]
-        except IndexError as err:
-            msg = f"No milestones found matching: {title_prefix}"
-            raise ValueError(msg) from err
+        if title_prefix not in cache.latest:
+            latest_version, latest = None, None
+            for milestone in cache.milestones:
+                if title_prefix not in milestone.title:
+                    continue
+
+                version = parse(milestone.title)
+                if latest_version is None or version > latest_version:
+                    latest_version, latest = version, milestone
+
+            if latest is None:
+                msg = f"No milestones found matching: {title_prefix}"
+                raise ValueError(msg)
+
+            cache.latest[title_prefix] = latest
+
+        return cache.latest[title_prefix]
 
     return None
 
@@ -56,7 +106,7 @@ def _get_branch_milestone(
 _ML = TypeVar("_ML", bound="MilestoneLabel")
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MilestoneLabel:
     """Track a Meeseeks label together with its milestone and branch."""
 
@@ -73,44 +123,40 @@ class MilestoneLabel:
         return None
 
     @staticmethod
-    def _check_label(label: Label, options: Options) -> Label:
+    def _check_label(label: Label, branch_name: str) -> Label:
         """Return a label from a repository."""
-        if (
-            label.description
-            != f"on-merge: backport to {_get_branch_name(label, options)}"
-        ):
+        if label.description != f"on-merge: backport to {branch_name}":
             msg = f"Label {label.name} has incorrect description"
             raise ValueError(msg)
 
         return label
 
     @staticmethod
-    def _get_backport_branch(
-        repo: Repository,
-        label: Label,
-        options: Options,
-    ) -> Branch:
-        return repo.get_branch(_get_branch_name(label, options))
+    def _get_backport_branch(repo: Repository, branch_name: str) -> Branch:
+        return repo.get_branch(branch_name)
 
     @staticmethod
     def _get_backport_milestone(
-        repo: Repository,
-        branch: Branch,
+        milestones: MilestoneCache,
+        branch_name: str,
         options: Options,
     ) -> Milestone:
-        return _get_branch_milestone(repo, branch.name.split(".x")[0], options)
+        return _get_branch_milestone(milestones, branch_name.split(".x")[0], options)
 
     @classmethod
     def backport(
         cls: type[_ML],
         repo: Repository,
         label: Label,
+        milestones: MilestoneCache,
         options: Options,
     ) -> _ML:
         """Return a backport label from a repository."""
-        label = cls._check_label(label, options)
-        branch = cls._get_backport_branch(repo, label, options)
-        milestone = cls._get_backport_milestone(repo, branch, options)
+        name = _get_branch_name(label, options)
+
+        label = cls._check_label(label, name)
+        branch = cls._get_backport_branch(repo, name)
+        milestone = cls._get_backport_milestone(milestones, name, options)
 
         return cls(label, branch, milestone)
 
@@ -118,11 +164,13 @@ class MilestoneLabel:
     def no_backport(
         cls: type[_ML],
         repo: Repository,
+        label: Label,
+        milestones: MilestoneCache,
         options: Options,
     ) -> _ML:
         """Return a no-backport label from a repository."""
         return cls(
-            repo.get_label(options.no_backport),
+            label,
             repo.get_branch(repo.default_branch),
-            _get_branch_milestone(repo, "", options),
+            _get_branch_milestone(milestones, "", options),
         )
@@ -9,7 +9,7 @@ from pull import PullRequest
 _M = TypeVar("_M", bound="Meeseeks")
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Meeseeks:
     """Hold all the information about Meeseeks labels for a pull request."""
 
@@ -1,11 +1,14 @@
 """Read options from environment variables."""
 
+import re
 from dataclasses import dataclass
 from enum import StrEnum
+from functools import cache
 from os import environ
-from re import sub
 from typing import Self, TypeVar
 
+_CAMEL_RE = re.compile(r"(?<!^)(?=[A-Z])")
+
 _EO = TypeVar("_EO", bound="EnvOption")
 
 
@@ -22,13 +25,14 @@ class EnvOption(StrEnum):
         return getattr(cls, "DEFAULT").value  # noqa: B009
 
     @classmethod
+    @cache
     def env_name(cls: type[_EO]) -> str:
         """
         Get the environment variable name for the option.
 
             This is always the all caps snake case version of the class name.
         """
-        return sub(r"(?<!^)(?=[A-Z])", "_", cls.__name__).upper()
+        return _CAMEL_RE.sub("_", cls.__name__).upper()
 
     @classmethod
     def read_env(cls: type[_EO]) -> str:
@@ -65,6 +69,12 @@ _ES = TypeVar("_ES", bound="EnvSetting")
 class EnvSetting(EnvOption):
     """Base class for environment settings."""
 
+    @classmethod
+    @cache
+    def _values(cls: type[_ES]) -> frozenset[str]:
+        """Return the values the setting can take."""
+        return frozenset(member.value for member in cls)
+
     @classmethod
     def read_env(cls: type[_ES]) -> str:
         """
@@ -78,7 +88,7 @@ class EnvSetting(EnvOption):
         """
         value = super().read_env()
 
-        if value not in list(cls):
+        if value not in cls._values():
             msg = f"Invalid value for {cls.env_name()}: {value}"
             raise ValueError(msg)
 
@@ -103,7 +113,7 @@ class SetMilestone(EnvSetting):
 _O = TypeVar("_O", bound="Options")
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Options:
     """Environment options read from environment variables."""
 
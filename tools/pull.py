@@ -1,32 +1,59 @@
 """Tools for working with pull requests."""
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from json import load
+from functools import cached_property
 from os import environ
 from pathlib import Path
 from sys import stdout
+from threading import local
 from typing import Self, TypeVar
+from urllib.parse import quote
 
-from github import Github
+from github import Github, GithubException
 from github.Issue import Issue
+from github.Label import Label
 from github.Milestone import Milestone
 from github.Repository import Repository
-from labels import MilestoneLabel
+from labels import MilestoneCache, MilestoneLabel
 from options import Options
+from orjson import loads
 
+_E = TypeVar("_E", bound="Event")
 _PR = TypeVar("_PR", bound="PullRequest")
 
-
-@dataclass
-class PullRequest:
-    """Hold all the information about a pull request."""
-
-    backport: dict[str, MilestoneLabel]
+_BACKPORT_LABELS_QUERY = """
+query($owner: String!, $name: String!, $prefix: String!, $noBackport: String!) {
+  repository(owner: $owner, name: $name) {
+    labels(first: 100, query: $prefix) {
+      pageInfo { hasNextPage }
+      nodes { name description color }
+    }
+    noBackport: label(name: $noBackport) { name description color }
+    milestones(first: 100, states: OPEN) {
+      pageInfo { hasNextPage }
+      nodes { number title }
+    }
+  }
+}
+"""
+
+_MAX_WORKERS = 5
+
+_BackportLabels = tuple[list[Label], Label, list[Milestone]]
+
+
+@dataclass(slots=True, frozen=True)
+class Event:
+    """Hold the parts of a pull request event used by Meeseeks."""
+
+    full_name: str
+    number: int
     labels: list[str]
-    issue: Issue
 
-    @staticmethod
-    def _get_event() -> dict:
+    @classmethod
+    def from_environ(cls: type[_E]) -> _E:
+        """Read the pull request event from the environment."""
         if (name := environ["GITHUB_EVENT_NAME"]) not in (
             "pull_request",
             "pull_request_target",
@@ -35,75 +62,216 @@ class PullRequest:
 
             raise ValueError(msg)
 
-        with Path(environ["GITHUB_EVENT_PATH"]).open(encoding="utf-8") as event_file:
-            return load(event_file)
+        event = loads(Path(environ["GITHUB_EVENT_PATH"]).read_bytes())
+        pull_request = event["pull_request"]
+
+        return cls(
+            pull_request["head"]["repo"]["full_name"],
+            event["number"],
+            [label["name"] for label in pull_request["labels"]],
+        )
+
+
+# No slots, the cached issue is stored in the instance __dict__
+@dataclass(frozen=True)
+class PullRequest:
+    """Hold all the information about a pull request."""
+
+    backport: dict[str, MilestoneLabel]
+    labels: list[str]
+    _repo: Repository
+    _number: int
 
     @staticmethod
-    def _get_repo(event: dict) -> Repository:
-        g = Github(environ["GITHUB_TOKEN"])
+    def _get_repo(full_name: str) -> Repository:
+        g = Github(environ["GITHUB_TOKEN"], per_page=100)
+
+        return g.get_repo(full_name)
+
+    @staticmethod
+    def _query_backport_labels(
+        repo: Repository,
+        full_name: str,
+        options: Options,
+    ) -> _BackportLabels | None:
+        """
+        Fetch the backport labels and open milestones with one GraphQL query.
+
+            This returns None if the query fails or its results are truncated,
+            in which case the REST API should be used instead.
+
+            PyGithub 1.x has no public access to a repository's requester,
+            which is needed both to post the query and to build Label and
+            Milestone objects that behave like the ones the REST API returns.
+        """
+        owner, name = full_name.split("/")
+        requester = repo._requester  # noqa: SLF001
+
+        try:
+            _, data = requester.requestJsonAndCheck(
+                "POST",
+                "/graphql",
+                input={
+                    "query": _BACKPORT_LABELS_QUERY,
+                    "variables": {
+                        "owner": owner,
+                        "name": name,
+                        "prefix": options.label_prefix,
+                        "noBackport": options.no_backport,
+                    },
+                },
+            )
+        except GithubException:
+            return None
 
-        return g.get_repo(event["pull_request"]["head"]["repo"]["full_name"])
+        if data.get("errors") or (result := data["data"]["repository"]) is None:
+            return None
+
+        labels, milestones = result["labels"], result["milestones"]
+        if (
+            labels["pageInfo"]["hasNextPage"]
+            or milestones["pageInfo"]["hasNextPage"]
+            or result["noBackport"] is None
+        ):
+            return None
+
+        def _label(node: dict) -> Label:
+            return Label(
+                requester,
+                {},
+                {**node, "url": f"{repo.url}/labels/{quote(node['name'])}"},
+                completed=True,
+            )
+
+        return (
+            [
+                _label(node)
+                for node in labels["nodes"]
+                if node["name"].startswith(options.label_prefix)
+            ],
+            _label(result["noBackport"]),
+            [
+                Milestone(
+                    requester,
+                    {},
+                    {
+                        **node,
+                        "state": "open",
+                        "url": f"{repo.url}/milestones/{node['number']}",
+                    },
+                    completed=True,
+                )
+                for node in milestones["nodes"]
+            ],
+        )
 
     @staticmethod
+    def _list_backport_labels(
+        repo: Repository,
+        options: Options,
+    ) -> _BackportLabels:
+        """Fetch the backport labels and open milestones with the REST API."""
+        return (
+            [
+                label
+                for label in repo.get_labels()
+                if label.name.startswith(options.label_prefix)
+            ],
+            repo.get_label(options.no_backport),
+            list(repo.get_milestones(state="open")) if options.run_milestone else [],
+        )
+
+    @classmethod
     def _get_backport_labels(
+        cls: type[_PR],
         repo: Repository,
+        full_name: str,
         options: Options,
     ) -> dict[str, MilestoneLabel]:
-        labels = [
-            MilestoneLabel.backport(repo, label, options)
-            for label in repo.get_labels()
-            if label.name.startswith(options.label_prefix)
-        ]
-        labels.append(MilestoneLabel.no_backport(repo, options))
+        if (result := cls._query_backport_labels(repo, full_name, options)) is None:
+            result = cls._list_backport_labels(repo, options)
+
+        backport, no_backport, milestones = result
+        milestones = MilestoneCache.from_milestones(milestones, options)
+
+        # Each label needs its own branch lookup, run them concurrently. A
+        # PyGithub requester reuses one connection for all of its calls and
+        # is not thread safe, so every worker gets its own client.
+        worker = local()
+
+        def _init_worker() -> None:
+            worker.repo = cls._get_repo(full_name)
+
+        with ThreadPoolExecutor(
+            max_workers=min(_MAX_WORKERS, len(backport) + 1),
+            initializer=_init_worker,
+        ) as executor:
+            no_backport_label = executor.submit(
+                lambda: MilestoneLabel.no_backport(
+                    worker.repo,
+                    no_backport,
+                    milestones,
+                    options,
+                ),
+            )
+            labels = list(
+                executor.map(
+                    lambda label: MilestoneLabel.backport(
+                        worker.repo,
+                        label,
+                        milestones,
+                        options,
+                    ),
+                    backport,
+                ),
+            )
+            labels.append(no_backport_label.result())
 
         return {label.label.name: label for label in labels}
 
     @staticmethod
-    def _get_pr_labels(event: dict, backport: list[str]) -> list[str]:
-        return [
-            label["name"]
-            for label in event["pull_request"]["labels"]
-            if label["name"] in backport
-        ]
+    def _get_pr_labels(event: Event, backport: frozenset[str]) -> list[str]:
+        return [label for label in event.labels if label in backport]
 
     @classmethod
     def from_environ(cls: type[_PR], options: Options) -> _PR:
         """Construct a PullRequest from the environment."""
-        event = cls._get_event()
-        repo = cls._get_repo(event)
+        event = Event.from_environ()
+        repo = cls._get_repo(event.full_name)
 
-        backport = cls._get_backport_labels(repo, options)
+        backport = cls._get_backport_labels(repo, event.full_name, options)
 
         return cls(
             backport,
-            cls._get_pr_labels(event, list(backport.keys())),
-            repo.get_issue(event["number"]),
+            cls._get_pr_labels(event, frozenset(backport)),
+            repo,
+            event.number,
         )
 
-    def _check_has_backport(self: Self) -> None:
-        """Check that the PR has a backport label."""
-        if len(self.labels) == 0:
-            msg = "PR requires backport labeling"
-
-            raise ValueError(msg)
-
-    def _check_no_backport(self: Self, options: Options) -> None:
-        """Check that PR does not have a backport and no-backport labels."""
-        if options.no_backport in self.labels and len(self.labels) > 1:
-            msg = f"PR has both a {options.no_backport} and backport labels"
-
-            raise ValueError(msg)
+    @cached_property
+    def issue(self: Self) -> Issue:
+        """Return the issue of the pull request."""
+        return self._repo.get_issue(self._number)
 
     def check(self: Self, options: Options) -> None:
         """Check that the labels are valid."""
         if options.run_check:
-            stdout.write("Checking backport labels...\n")
-            stdout.write(f"    Available backport labels: {list(self.backport)}\n")
-            stdout.write(f"    Found backport labels: {self.labels}\n")
+            stdout.write(
+                "Checking backport labels...\n"
+                f"    Available backport labels: {list(self.backport)}\n"
+                f"    Found backport labels: {self.labels}\n",
+            )
             stdout.flush()
 
-            self._check_has_backport()
-            self._check_no_backport(options)
+            if (n_labels := len(self.labels)) == 0:
+                msg = "PR requires backport labeling"
+
+                raise ValueError(msg)
+
+            if n_labels > 1 and options.no_backport in self.labels:
+                msg = f"PR has both a {options.no_backport} and backport labels"
+
+                raise ValueError(msg)
 
     def _calculate_milestone(self: Self, options: Options) -> Milestone:
         """
@@ -115,24 +283,31 @@ class PullRequest:
             return self.backport[options.no_backport].milestone
 
         labels = {(bp := self.backport[label]).version: bp for label in self.labels}
-        return labels[sorted(labels.keys())[0]].milestone
+        return labels[min(labels)].milestone
 
     def set_milestone(self: Self, options: Options) -> None:
         """Set the milestone on the pull request."""
         if options.run_milestone:
             stdout.write("Checking milestone...\n")
+            stdout.flush()
 
             current = self.issue.milestone
             new = self._calculate_milestone(options)
 
             stdout.write(
                 "    Current milestone: "
-                f"{None if current is None else current.title}\n",
+                f"{None if current is None else current.title}\n"
+                f"    Calculated milestone: {new.title}\n",
             )
-            stdout.write(f"    Calculated milestone: {new.title}\n")
             stdout.flush()
 
-            if current is not None and current != new and not options.overwrite:
+            if current is not None and current == new:
+                stdout.write("    Milestone already set\n")
+                stdout.flush()
+
+                return
+
+            if current is not None and not options.overwrite:
                 msg = f"PR already has milestone: {current.title}"
                 raise ValueError(msg)
 